@@ -350,8 +350,10 @@ class MessageAdmin(NewsletterAdminLinkMixin, ExtendibleModelAdminMixin,
     def subscribers_json(self, request, object_id):
         message = self._getobj(request, object_id)
 
+        # Only primary keys are serialized, so don't load any other fields
         json = serializers.serialize(
-            "json", message.newsletter.get_subscriptions(), fields=()
+            "json", message.newsletter.get_subscriptions().only('pk'),
+            fields=()
         )
         return HttpResponse(json, content_type='application/json')
 
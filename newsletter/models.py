@@ -1,13 +1,18 @@
 import logging
+import mimetypes
 import os
+import queue
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.contrib.sites.managers import CurrentSiteManager
-from django.core.mail import EmailMultiAlternatives
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django import db
 from django.db import models
+from django.db.models import prefetch_related_objects
 from django.template.loader import select_template
 from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
@@ -16,8 +21,9 @@ from django.utils.timezone import now
 from django.urls import reverse
 
 from .fields import DynamicImageField
+from .settings import newsletter_settings
 from .utils import (
-    make_activation_code, get_default_sites, ACTIONS
+    make_activation_code, get_default_sites, chunked, sleep_until, ACTIONS
 )
 
 logger = logging.getLogger(__name__)
@@ -123,6 +129,19 @@ class Newsletter(models.Model):
 
         return Subscription.objects.filter(newsletter=self, subscribed=True)
 
+    def get_suppressed_emails(self):
+        """
+        Return a set of lower case e-mail addresses which should not be sent
+        messages, e.g. because they are known to bounce, as listed by the
+        callable in the `NEWSLETTER_SUPPRESSION_LIST` setting.
+        """
+        suppression_list = newsletter_settings.SUPPRESSION_LIST
+
+        if not suppression_list:
+            return set()
+
+        return {email.lower() for email in suppression_list(self)}
+
     @classmethod
     def get_default(cls):
         try:
@@ -238,11 +257,14 @@ class Subscription(models.Model):
         # replaced by a method property.
 
         if self.pk:
-            assert(Subscription.objects.filter(pk=self.pk).count() == 1)
-
-            subscription = Subscription.objects.get(pk=self.pk)
-            old_subscribed = subscription.subscribed
-            old_unsubscribed = subscription.unsubscribed
+            try:
+                old_subscribed, old_unsubscribed = self._loaded_state
+            except AttributeError:
+                # State was not loaded along with this instance
+                old_subscribed, old_unsubscribed = \
+                    Subscription.objects.values_list(
+                        'subscribed', 'unsubscribed'
+                    ).get(pk=self.pk)
 
             # If we are subscribed now and we used not to be so, subscribe.
             # If we user to be unsubscribed but are not so anymore, subscribe.
@@ -270,6 +292,32 @@ class Subscription(models.Model):
 
         super().save(*args, **kwargs)
 
+        self._remember_state()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+
+        if not {'subscribed', 'unsubscribed'} & instance.get_deferred_fields():
+            instance._remember_state()
+
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+
+        if fields is None or {'subscribed', 'unsubscribed'} <= set(fields):
+            self._remember_state()
+        elif {'subscribed', 'unsubscribed'} & set(fields):
+            self.__dict__.pop('_loaded_state', None)
+
+    def _remember_state(self):
+        """
+        Remember the subscription state as stored in the database, so save()
+        can detect changes without querying it.
+        """
+        self._loaded_state = (self.subscribed, self.unsubscribed)
+
     ip = models.GenericIPAddressField(_("IP address"), blank=True, null=True)
 
     newsletter = models.ForeignKey(
@@ -509,14 +557,12 @@ class Message(models.Model):
     def get_next_article_sortorder(self):
         """ Get next available sortorder for Article. """
 
-        next_order = self.articles.aggregate(
-            models.Max('sortorder')
-        )['sortorder__max']
+        # Ordering allows using the (post, sortorder) index, unlike Max()
+        last_order = self.articles.order_by('-sortorder').values_list(
+            'sortorder', flat=True
+        ).first()
 
-        if next_order:
-            return next_order + 10
-        else:
-            return 10
+        return (last_order or 0) + 10
 
     @cached_property
     def _templates(self):
@@ -570,37 +616,253 @@ class Submission(models.Model):
         }
 
     def submit(self):
-        subscriptions = self.subscriptions.filter(subscribed=True)
-
-        logger.info(
-            gettext("Submitting %(submission)s to %(count)d people"),
-            {'submission': self, 'count': subscriptions.count()}
-        )
+        subscriptions = self.subscriptions.filter(
+            subscribed=True
+        ).select_related('user', 'newsletter')
 
         assert self.publish_date < now(), \
             'Something smells fishy; submission time in future.'
 
+        # Only update the state, rather than saving all fields, as to not
+        # overwrite changes made to the submission in the meantime.
         self.sending = True
-        self.save()
+        type(self).objects.filter(pk=self.pk).update(sending=True)
+
+        # Every worker reuses a connection for all of its messages rather than
+        # setting up a new one (including TLS handshake) for every recipient.
+        # Connections are kept along with the times their next batch and next
+        # message are due.
+        connections = queue.SimpleQueue()
 
         try:
-            for idx, subscription in enumerate(subscriptions, start=1):
-                if hasattr(settings, 'NEWSLETTER_EMAIL_DELAY'):
-                    time.sleep(settings.NEWSLETTER_EMAIL_DELAY)
-                if hasattr(settings, 'NEWSLETTER_BATCH_SIZE') and settings.NEWSLETTER_BATCH_SIZE > 0:
-                    if idx % settings.NEWSLETTER_BATCH_SIZE == 0:
-                        time.sleep(settings.NEWSLETTER_BATCH_DELAY)
-                self.send_message(subscription)
+            # Articles and attachments are used by every rendered message
+            prefetch_related_objects(
+                [self.message], 'articles', 'attachments'
+            )
+
+            # Resolve values shared by all messages once, rather than per
+            # message
+            variable_dict = self._get_variable_dict()
+            sender = self.newsletter.get_sender()
+            attachments = self._get_attachments()
+
+            concurrency = max(newsletter_settings.CONCURRENCY, 1)
+
+            for _i in range(concurrency):
+                connections.put((get_connection(), None, None))
+
+            batch_size = newsletter_settings.BATCH_SIZE
+
+            # Stream subscriptions rather than loading them all in memory
+            subscriptions = subscriptions.iterator(chunk_size=batch_size)
+
+            # Skip addresses known to be dead before rendering or sending
+            suppressed = self.newsletter.get_suppressed_emails()
+            if suppressed:
+                subscriptions = (
+                    subscription for subscription in subscriptions
+                    if subscription.email.lower() not in suppressed
+                )
+
+            # Messages are rendered here, as workers should not access the
+            # database, and sent in the calling thread or by workers.
+            batches = (
+                [
+                    self._build_message(
+                        subscription, variable_dict=variable_dict,
+                        sender=sender, attachments=attachments
+                    )
+                    for subscription in batch
+                ]
+                for batch in chunked(subscriptions, batch_size)
+            )
+
+            count = failures = 0
+
+            if concurrency == 1:
+                # Send in the calling thread, as mail backends storing
+                # messages in the database should use its connection.
+                for messages in batches:
+                    sent = self._send_batch(messages, connections)
+
+                    count += len(messages)
+                    failures += len(messages) - sent
+
+                    self._check_failures(count, failures)
+
+            else:
+                # Only as many batches are queued as there are workers, as to
+                # bound memory usage.
+                with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                    # Number of messages for each batch being sent
+                    pending = {}
+
+                    for messages in batches:
+                        if len(pending) >= concurrency:
+                            done = wait(
+                                pending, return_when=FIRST_COMPLETED
+                            ).done
+
+                            for future in done:
+                                count += pending[future]
+                                failures += (
+                                    pending.pop(future) - future.result()
+                                )
+
+                            self._check_failures(count, failures)
+
+                        future = executor.submit(
+                            self._send_batch_in_thread, messages, connections
+                        )
+                        pending[future] = len(messages)
+
+                    for future in pending:
+                        count += pending[future]
+                        failures += pending[future] - future.result()
+
+            logger.info(
+                gettext("Submitted %(submission)s to %(sent)d people, "
+                        "%(failures)d failed"),
+                {'submission': self, 'sent': count - failures,
+                 'failures': failures}
+            )
+
             self.sent = True
 
         finally:
+            while not connections.empty():
+                connection, _next_batch, _next_message = connections.get()
+                connection.close()
+
             self.sending = False
-            self.save()
+            type(self).objects.filter(pk=self.pk).update(
+                sending=False, sent=self.sent
+            )
 
-    def send_message(self, subscription):
-        variable_dict = {
-            'subscription': subscription,
-            'site': Site.objects.get_current(),
+    def _check_failures(self, attempts, failures):
+        """
+        Abort when a large share of the messages sent so far failed, which
+        usually means the mail server refuses them all, rather than trying
+        every single remaining recipient.
+
+        Aborted submissions are taken out of the queue, as to not send the
+        message again to those who already received it on every next run;
+        it is up to an admin to submit it again.
+        """
+
+        if attempts >= 30 and failures > attempts / 3:
+            self.prepared = False
+            type(self).objects.filter(pk=self.pk).update(prepared=False)
+
+            logger.error(
+                gettext('Aborted submitting %(submission)s, as %(failures)d '
+                        'out of %(attempts)d messages failed.'),
+                {'submission': self, 'failures': failures,
+                 'attempts': attempts}
+            )
+
+            raise RuntimeError(
+                'Aborting submission, %d out of %d messages failed.' % (
+                    failures, attempts
+                )
+            )
+
+    def _send_batch(self, messages, connections):
+        """
+        Send a batch of messages over a connection taken from connections,
+        returning the number of messages sent.
+
+        Delays are measured from the start of the previous message or batch
+        sent over the same connection, so time spent sending counts towards
+        them and the configured rate is kept.
+        """
+
+        # Deadlines are None for connections which have not been used yet
+        connection, next_batch, next_message = connections.get()
+
+        try:
+            if next_batch is not None:
+                sleep_until(next_batch)
+
+                # Reconnect between batches, as many providers limit
+                # the amount of messages sent over one connection.
+                connection.close()
+
+            next_batch = time.monotonic() + newsletter_settings.BATCH_DELAY
+
+            try:
+                connection.open()
+
+            except Exception as e:
+                # Leave connecting to the backend when sending each message,
+                # as to fail those messages rather than the whole submission.
+                logger.error(
+                    gettext('Connecting for %(submission)s failed '
+                            'with error: %(error)s'),
+                    {'submission': self, 'error': e}
+                )
+
+                connection.close()
+
+            email_delay = newsletter_settings.EMAIL_DELAY
+
+            if not email_delay:
+                return self._send_messages(messages, connection)
+
+            # Honour the delay between messages, including the last message of
+            # the previous batch.
+            sent = 0
+            for message in messages:
+                if next_message is not None:
+                    sleep_until(next_message)
+
+                next_message = time.monotonic() + email_delay
+
+                sent += self._send_messages([message], connection)
+
+            return sent
+
+        finally:
+            connections.put((connection, next_batch, next_message))
+
+    def _send_batch_in_thread(self, messages, connections):
+        """
+        Send a batch of messages from a worker thread, closing the database
+        connections the mail backend may have opened in this thread.
+        """
+
+        try:
+            return self._send_batch(messages, connections)
+        finally:
+            db.connections.close_all()
+
+    def _get_attachments(self):
+        """
+        Return a (filename, content, mimetype) tuple for each of the message's
+        attachments, as to read every file only once for all messages.
+        """
+
+        attachments = []
+
+        for attachment in self.message.attachments.all():
+            with attachment.file.open('rb') as f:
+                content = f.read()
+
+            filename = attachment.file_name
+            mimetype, _encoding = mimetypes.guess_type(filename)
+
+            attachments.append((filename, content, mimetype))
+
+        return attachments
+
+    def _get_variable_dict(self, site=None):
+        """
+        Return the template context shared by the messages to all
+        subscriptions.
+        """
+
+        return {
+            'site': site or Site.objects.get_current(),
             'submission': self,
             'message': self.message,
             'newsletter': self.newsletter,
@@ -609,21 +871,38 @@ class Submission(models.Model):
             'MEDIA_URL': settings.MEDIA_URL
         }
 
+    def _build_message(self, subscription, variable_dict=None, sender=None,
+                       attachments=None):
+        """ Return the e-mail message for a particular subscription. """
+
+        if variable_dict is None:
+            variable_dict = self._get_variable_dict()
+
+        if sender is None:
+            sender = self.newsletter.get_sender()
+
+        if attachments is None:
+            attachments = self._get_attachments()
+
+        # Copy the shared context, as rendering may add variables to it
+        variable_dict = dict(variable_dict, subscription=subscription)
+
+        # Resolve name and address (possibly through the user) only once
+        recipient = subscription.get_recipient()
+
         subject = self.message.subject_template.render(
             variable_dict).strip()
         text = self.message.text_template.render(variable_dict)
 
         message = EmailMultiAlternatives(
             subject, text,
-            from_email=self.newsletter.get_sender(),
-            to=[subscription.get_recipient()],
+            from_email=sender,
+            to=[recipient],
             headers=self.extra_headers,
         )
 
-        attachments = Attachment.objects.filter(message_id=self.message.id)
-
-        for attachment in attachments:
-            message.attach_file(attachment.file.path)
+        for filename, content, mimetype in attachments:
+            message.attach(filename, content, mimetype)
 
         if self.message.html_template:
             message.attach_alternative(
@@ -631,22 +910,51 @@ class Submission(models.Model):
                 "text/html"
             )
 
-        try:
+        # Skip translating and formatting when not debugging, as this
+        # happens for every single recipient.
+        if logger.isEnabledFor(logging.DEBUG):
             logger.debug(
                 gettext('Submitting message to: %s.'),
-                subscription
+                recipient
             )
 
-            message.send()
+        return message
 
-        except Exception as e:
-            # TODO: Test coverage for this branch.
-            logger.error(
-                gettext('Message %(subscription)s failed '
-                        'with error: %(error)s'),
-                {'subscription': subscription,
-                 'error': e}
-            )
+    def _send_messages(self, messages, connection):
+        """
+        Send messages over connection, returning the number of messages sent.
+
+        Messages are passed to the backend one at a time, as backends give up
+        on the remainder of a batch when a single message fails.
+        """
+
+        sent = 0
+
+        for message in messages:
+            try:
+                sent += connection.send_messages([message]) or 0
+
+            except Exception as e:
+                logger.error(
+                    gettext('Message %(subscription)s failed '
+                            'with error: %(error)s'),
+                    {'subscription': ', '.join(message.to),
+                     'error': e}
+                )
+
+        return sent
+
+    def send_message(self, subscription, site=None, sender=None,
+                     connection=None):
+        """ Send the message to a single subscription. """
+
+        self._send_messages(
+            [self._build_message(
+                subscription, variable_dict=self._get_variable_dict(site),
+                sender=sender
+            )],
+            connection or get_connection()
+        )
 
     @classmethod
     def submit_queue(cls):
@@ -656,7 +964,14 @@ class Submission(models.Model):
         )
 
         for submission in todo:
-            submission.submit()
+            # Claim the submission before sending, so that queue workers
+            # running at the same time never send out a submission twice.
+            claimed = cls.objects.filter(
+                pk=submission.pk, sent=False, sending=False
+            ).update(sending=True)
+
+            if claimed:
+                submission.submit()
 
     @classmethod
     def from_message(cls, message):
@@ -665,10 +980,18 @@ class Submission(models.Model):
         submission.message = message
         submission.newsletter = message.newsletter
         submission.save()
-        try:
-            submission.subscriptions.set(message.newsletter.get_subscriptions())
-        except AttributeError:  # Django < 1.10
-            submission.subscriptions = message.newsletter.get_subscriptions()
+
+        # Insert recipients in bulk, rather than through the related manager,
+        # as the submission is new and has no existing recipients to check.
+        Recipient = cls.subscriptions.through
+        subscription_ids = message.newsletter.get_subscriptions().values_list(
+            'pk', flat=True
+        )
+        Recipient.objects.bulk_create([
+            Recipient(submission_id=submission.pk, subscription_id=pk)
+            for pk in subscription_ids
+        ], batch_size=1000, ignore_conflicts=True)
+
         return submission
 
     def save(self, **kwargs):
@@ -67,6 +67,11 @@ class NewsletterSettings(Settings):
 
     DEFAULT_CONFIRM_EMAIL = True
 
+    DEFAULT_EMAIL_DELAY = 0
+    DEFAULT_BATCH_DELAY = 0
+    DEFAULT_BATCH_SIZE = 100
+    DEFAULT_CONCURRENCY = 1
+
     @property
     def DEFAULT_CONFIRM_EMAIL_SUBSCRIBE(self):
         return self.CONFIRM_EMAIL
@@ -79,6 +84,19 @@ class NewsletterSettings(Settings):
     def DEFAULT_CONFIRM_EMAIL_UPDATE(self):
         return self.CONFIRM_EMAIL
 
+    @property
+    def BATCH_SIZE(self):
+        """
+        Return the number of messages per batch, falling back to the default
+        when not set to a positive number.
+        """
+        batch_size = getattr(django_settings, "NEWSLETTER_BATCH_SIZE", None)
+
+        if not batch_size or batch_size < 0:
+            return self.DEFAULT_BATCH_SIZE
+
+        return batch_size
+
     @property
     def RICHTEXT_WIDGET(self):
         # Import and set the richtext field
@@ -103,6 +121,31 @@ class NewsletterSettings(Settings):
 
         return None
 
+    @property
+    def SUPPRESSION_LIST(self):
+        """
+        Import and return the callable listing e-mail addresses which should
+        not be sent messages, if set.
+        """
+        NEWSLETTER_SUPPRESSION_LIST = getattr(
+            django_settings, "NEWSLETTER_SUPPRESSION_LIST", ""
+        )
+
+        if NEWSLETTER_SUPPRESSION_LIST:
+            try:
+                module, attr = NEWSLETTER_SUPPRESSION_LIST.rsplit(".", 1)
+                mod = import_module(module)
+                return getattr(mod, attr)
+            except Exception as e:
+                raise ImproperlyConfigured(
+                    "Error while importing setting "
+                    "NEWSLETTER_SUPPRESSION_LIST %r: %s" % (
+                        NEWSLETTER_SUPPRESSION_LIST, e
+                    )
+                )
+
+        return None
+
     @property
     def THUMBNAIL(self):
         """Validates and returns the set thumbnail application."""
@@ -1,7 +1,9 @@
 """ Generic helper functions """
 
 import logging
+import time
 
+from itertools import islice
 
 from django.contrib.sites.models import Site
 from django.utils.crypto import get_random_string
@@ -20,6 +22,29 @@ def make_activation_code():
     return get_random_string(length=40)
 
 
+def chunked(iterable, size):
+    """ Yield lists of at most `size` items from `iterable`. """
+
+    iterator = iter(iterable)
+
+    while True:
+        chunk = list(islice(iterator, size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def sleep_until(deadline):
+    """ Sleep until `deadline`, as returned by `time.monotonic()`. """
+
+    delay = deadline - time.monotonic()
+
+    if delay > 0:
+        time.sleep(delay)
+
+
 def get_default_sites():
     """ Get a list of id's for all sites; the default for newsletters. """
     return [site.id for site in Site.objects.all()]
@@ -323,6 +323,28 @@ Unsubscribe: http://example.com/newsletter/test-newsletter/unsubscribe/
             self.assertContains(response, '<h2>Attachments</h2>', html=True)
         self.assertContains(response, '<a href="/tests/files/sample.txt">tests/files/sample.txt</a>', html=True)
 
+    def test_message_subscribers_json(self):
+        """ Test listing subscriptions for a message as JSON. """
+
+        subscription = Subscription.objects.create(
+            newsletter=self.newsletter, email_field='test@test.com',
+            subscribed=True
+        )
+        Subscription.objects.create(
+            newsletter=self.newsletter, email_field='other@test.com',
+            subscribed=False
+        )
+
+        response = self.client.get(reverse(
+            'admin:newsletter_message_subscribers_json', args=[self.message.pk]
+        ))
+
+        self.assertEqual(response.json(), [{
+            'model': 'newsletter.subscription',
+            'pk': subscription.pk,
+            'fields': {}
+        }])
+
 
 class MessageAdminTests(AdminTestMixin, TestCase):
     """ Tests for Message admin. """
@@ -1,12 +1,18 @@
 import itertools
 import os
+import smtplib
+import threading
 
 from unittest import mock
 import unittest
 
 from datetime import timedelta
 
+from django.contrib.auth import get_user_model
 from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.db import connection, connections
+from django.test.utils import CaptureQueriesContext, override_settings
 
 from django.utils.timezone import now
 
@@ -20,6 +26,57 @@ from .utils import MailTestCase, UserTestCase, template_exists
 NUM_SUBSCRIBED = 2
 
 
+def get_suppressed_emails(newsletter):
+    """ Suppression list for testing purposes. """
+    return ['Test@Test.com']
+
+
+class RefusingEmailBackend(EmailBackend):
+    """
+    Backend refusing test@test.com, giving up on the rest of a batch like the
+    SMTP backend does.
+    """
+
+    def send_messages(self, messages):
+        for message in messages:
+            if 'test@test.com' in message.to[0]:
+                raise smtplib.SMTPRecipientsRefused({message.to[0]: (550, '')})
+
+            super().send_messages([message])
+
+        return len(messages)
+
+
+class ReconnectFailingEmailBackend(EmailBackend):
+    """
+    Backend failing to connect again after the first connection is closed,
+    connecting when sending like the SMTP backend does.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        self.connected = False
+        self.connects = 0
+
+    def open(self):
+        self.connects += 1
+
+        if self.connects > 1:
+            raise smtplib.SMTPServerDisconnected()
+
+        self.connected = True
+
+    def close(self):
+        self.connected = False
+
+    def send_messages(self, messages):
+        if not self.connected:
+            self.open()
+
+        return super().send_messages(messages)
+
+
 class MailingTestCase(MailTestCase):
 
     def get_newsletter_kwargs(self):
@@ -229,6 +286,90 @@ class SubmitSubmissionTestCase(MailingTestCase):
             'http://example.com/newsletter/test-newsletter/unsubscribe/'
         )
 
+    def test_attachments(self):
+        """ Test whether attachments are added to every email. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), NUM_SUBSCRIBED)
+
+        for my_email in mail.outbox:
+            self.assertEqual(len(my_email.attachments), 1)
+            filename, content, mimetype = my_email.attachments[0]
+            self.assertEqual(filename, 'sample.pdf')
+            self.assertEqual(mimetype, 'application/pdf')
+            self.assertTrue(content)
+
+    def test_articles(self):
+        """ Test whether articles are rendered in every email. """
+
+        Article.objects.create(
+            title='Test article', text='Test text', post=self.m
+        )
+
+        self.n.send_html = False
+        self.n.save()
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), NUM_SUBSCRIBED)
+        self.assertEmailBodyContains('Test article')
+
+    def test_submit_queries(self):
+        """ Test whether the number of queries is independent of recipients. """
+
+        User = get_user_model()
+
+        def add_user_subscription(username):
+            user = User.objects.create_user(
+                username, '%s@test.com' % username, first_name=username
+            )
+            subscription = Subscription.objects.create(
+                user=user, newsletter=self.n, subscribed=True
+            )
+            self.sub.subscriptions.add(subscription)
+
+        add_user_subscription('john')
+
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with CaptureQueriesContext(connection) as queries:
+            Submission.objects.get(pk=self.sub.pk).submit()
+
+        add_user_subscription('paul')
+        add_user_subscription('george')
+
+        with self.assertNumQueries(len(queries)):
+            Submission.objects.get(pk=self.sub.pk).submit()
+
+        self.assertEqual(len(mail.outbox), 2 * NUM_SUBSCRIBED + 4)
+
+    @override_settings(
+        NEWSLETTER_SUPPRESSION_LIST='tests.test_mailing.get_suppressed_emails'
+    )
+    def test_suppressed_emails(self):
+        """ Test whether suppressed addresses are skipped. """
+
+        self.assertEqual(self.n.get_suppressed_emails(), {'test@test.com'})
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), NUM_SUBSCRIBED - 1)
+        self.assertEqual(mail.outbox[0].to, [self.s2.get_recipient()])
+
     def test_delayedsumbmission(self):
         """ Test delays between emails """
 
@@ -236,12 +377,50 @@ class SubmitSubmissionTestCase(MailingTestCase):
         self.sub.publish_date = now() - timedelta(seconds=1)
         self.sub.save()
 
+        # Freeze the clock, as time spent sending counts towards the delay
         with self.settings(NEWSLETTER_EMAIL_DELAY=0.01):
-            with mock.patch('time.sleep', return_value=None) as sleep_mock:
+            with mock.patch('time.monotonic', return_value=0.0), \
+                    mock.patch('time.sleep', return_value=None) as sleep_mock:
                 Submission.submit_queue()
 
         sleep_mock.assert_called_with(0.01)
 
+    def test_delay_includes_sending(self):
+        """ Test whether time spent sending counts towards delays """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        # Every reading of the clock advances it by 4ms
+        clock = itertools.count(0.0, 0.004)
+
+        with self.settings(NEWSLETTER_EMAIL_DELAY=0.01):
+            with mock.patch('time.monotonic', side_effect=clock), \
+                    mock.patch('time.sleep', return_value=None) as sleep_mock:
+                Submission.submit_queue()
+
+        sleep_mock.assert_called_once()
+        self.assertLess(sleep_mock.call_args.args[0], 0.01)
+
+    def test_delay_between_batches(self):
+        """ Test whether the delay between emails spans batches """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(
+            NEWSLETTER_BATCH_SIZE=1,
+            NEWSLETTER_EMAIL_DELAY=0.01
+        ):
+            with mock.patch('time.monotonic', return_value=0.0), \
+                    mock.patch('time.sleep', return_value=None) as sleep_mock:
+                Submission.submit_queue()
+
+        # Only the second email, in the second batch, is delayed
+        sleep_mock.assert_called_once_with(0.01)
+
     def test_delayedbatchsumbmission(self):
         """ Test delays between emails """
 
@@ -253,11 +432,276 @@ class SubmitSubmissionTestCase(MailingTestCase):
             NEWSLETTER_BATCH_SIZE=1,
             NEWSLETTER_BATCH_DELAY=0.02
         ):
-            with mock.patch('time.sleep', return_value=None) as sleep_mock:
+            with mock.patch('time.monotonic', return_value=0.0), \
+                    mock.patch('time.sleep', return_value=None) as sleep_mock:
                 Submission.submit_queue()
 
         sleep_mock.assert_called_with(0.02)
 
+    def test_batch_size_zero(self):
+        """ Test whether a batch size of zero still sends all emails. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(NEWSLETTER_BATCH_SIZE=0):
+            Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), NUM_SUBSCRIBED)
+
+        submission = Submission.objects.get(pk=self.sub.pk)
+        self.assertTrue(submission.sent)
+
+    def test_single_connection(self):
+        """ Test whether one connection is used for all emails. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with mock.patch(
+            'newsletter.models.get_connection', wraps=mail.get_connection
+        ) as connection_mock:
+            Submission.submit_queue()
+
+        connection_mock.assert_called_once()
+        self.assertEqual(len(mail.outbox), NUM_SUBSCRIBED)
+
+    def test_submit_calling_thread(self):
+        """ Test whether emails are sent from the calling thread. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        threads = set()
+
+        def send_messages(backend, messages):
+            threads.add(threading.current_thread())
+            return len(messages)
+
+        with mock.patch(
+            'django.core.mail.backends.locmem.EmailBackend.send_messages',
+            autospec=True, side_effect=send_messages
+        ):
+            Submission.submit_queue()
+
+        self.assertEqual(threads, {threading.current_thread()})
+
+    def test_batchsubmission(self):
+        """ Test whether emails are sent in batches. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(NEWSLETTER_BATCH_SIZE=1):
+            with mock.patch(
+                'django.core.mail.backends.locmem.EmailBackend.send_messages',
+                autospec=True, return_value=1
+            ) as send_mock:
+                Submission.submit_queue()
+
+        self.assertEqual(send_mock.call_count, NUM_SUBSCRIBED)
+
+        for call in send_mock.call_args_list:
+            self.assertEqual(len(call.args[1]), 1)
+
+    def test_refused_recipient(self):
+        """ Test whether a refused recipient only loses its own message. """
+
+        other = Subscription.objects.create(
+            name='Other Name', email='other@test.com',
+            newsletter=self.n, subscribed=True
+        )
+
+        messages = [
+            self.sub._build_message(subscription)
+            for subscription in (self.s2, self.s, other)
+        ]
+
+        sent = self.sub._send_messages(
+            messages, RefusingEmailBackend()
+        )
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(
+            [message.to for message in mail.outbox],
+            [[self.s2.get_recipient()], [other.get_recipient()]]
+        )
+
+    @override_settings(
+        EMAIL_BACKEND='tests.test_mailing.RefusingEmailBackend'
+    )
+    def test_concurrent_failures(self):
+        """ Test whether failures of concurrently sent batches are logged. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(
+            NEWSLETTER_BATCH_SIZE=1,
+            NEWSLETTER_CONCURRENCY=2
+        ):
+            with self.assertLogs('newsletter.models', 'INFO') as messages:
+                Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('to 1 people, 1 failed', messages.output[-1])
+
+    @override_settings(
+        EMAIL_BACKEND='tests.test_mailing.ReconnectFailingEmailBackend'
+    )
+    def test_reconnect_failure(self):
+        """ Test whether failing to reconnect only fails that batch. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(NEWSLETTER_BATCH_SIZE=1):
+            Submission.submit_queue()
+
+            # Recipients of the first batch don't receive it again
+            Submission.submit_queue()
+
+        self.assertEqual(len(mail.outbox), 1)
+
+        submission = Submission.objects.get(pk=self.sub.pk)
+        self.assertTrue(submission.sent)
+        self.assertFalse(submission.sending)
+
+    def test_concurrentsubmission(self):
+        """ Test sending batches over several connections. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(
+            NEWSLETTER_BATCH_SIZE=1,
+            NEWSLETTER_CONCURRENCY=2
+        ):
+            with mock.patch(
+                'newsletter.models.get_connection',
+                wraps=mail.get_connection
+            ) as connection_mock, mock.patch.object(
+                connections, 'close_all'
+            ) as close_mock:
+                Submission.submit_queue()
+
+        self.assertEqual(connection_mock.call_count, 2)
+
+        # Database connections of workers are closed after every batch
+        self.assertEqual(close_mock.call_count, NUM_SUBSCRIBED)
+        self.assertEqual(len(mail.outbox), NUM_SUBSCRIBED)
+
+        submission = Submission.objects.get(pk=self.sub.pk)
+        self.assertTrue(submission.sent)
+
+    def test_failing_submission(self):
+        """ Test whether submission is aborted when most messages fail. """
+
+        subscriptions = Subscription.objects.bulk_create([
+            Subscription(
+                email_field='test%d@test.com' % i,
+                newsletter=self.n, subscribed=True
+            ) for i in range(40)
+        ])
+        self.sub.subscriptions.add(*subscriptions)
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with self.settings(NEWSLETTER_BATCH_SIZE=10):
+            with mock.patch.object(
+                Submission, '_send_messages', return_value=0
+            ) as send_mock:
+                with self.assertRaises(RuntimeError):
+                    self.sub.submit()
+
+                # Aborted submission is no longer queued
+                Submission.submit_queue()
+
+        # Aborted after 30 failed attempts, instead of trying all 42
+        self.assertEqual(send_mock.call_count, 3)
+
+        submission = Submission.objects.get(pk=self.sub.pk)
+        self.assertFalse(submission.prepared)
+        self.assertFalse(submission.sent)
+        self.assertFalse(submission.sending)
+
+    def test_submit_missing_attachment(self):
+        """ Test whether a failing submission is no longer marked sending. """
+
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        with mock.patch.object(
+            Submission, '_get_attachments', side_effect=FileNotFoundError
+        ):
+            with self.assertRaises(FileNotFoundError):
+                self.sub.submit()
+
+        submission = Submission.objects.get(pk=self.sub.pk)
+        self.assertFalse(submission.sent)
+        self.assertFalse(submission.sending)
+
+    def test_submit_keeps_changes(self):
+        """ Test whether changes made while submitting are kept. """
+
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        def unpublish():
+            Submission.objects.filter(pk=self.sub.pk).update(publish=False)
+            return []
+
+        # Unpublish the submission elsewhere while it is being submitted
+        with mock.patch.object(
+            Submission, '_get_attachments', side_effect=unpublish
+        ):
+            self.sub.submit()
+
+        submission = Submission.objects.get(pk=self.sub.pk)
+        self.assertTrue(submission.sent)
+        self.assertFalse(submission.sending)
+        self.assertFalse(submission.publish)
+
+    def test_submit_queue_claimed(self):
+        """ Test whether submissions claimed by another worker are skipped. """
+
+        self.sub.prepared = True
+        self.sub.publish_date = now() - timedelta(seconds=1)
+        self.sub.save()
+
+        filter_submissions = Submission.objects.filter
+
+        def claim_first(*args, **kwargs):
+            # Another worker claims the submission right before this one
+            if 'pk' in kwargs:
+                filter_submissions(pk=self.sub.pk).update(sending=True)
+
+            return filter_submissions(*args, **kwargs)
+
+        with mock.patch.object(Submission, 'submit') as submit_mock:
+            with mock.patch.object(
+                Submission.objects, 'filter', side_effect=claim_first
+            ):
+                Submission.submit_queue()
+
+            submit_mock.assert_not_called()
+
+            # Once released, the submission is picked up again
+            filter_submissions(pk=self.sub.pk).update(sending=False)
+
+            Submission.submit_queue()
+
+            submit_mock.assert_called_once()
+
     def test_management_command(self):
         """ Test submission through management command. """
 
@@ -320,6 +764,27 @@ class SubscriptionTestCase(UserTestCase, MailingTestCase):
                 self.assertTrue(s.subscribed)
                 self.assertNotEqual(s.subscribe_date, old_subscribe_date)
 
+    def test_save_queries(self):
+        """ Test whether saving a loaded subscription only updates it. """
+
+        for s in self.ss:
+            subscription = Subscription.objects.select_related(
+                'user'
+            ).get(pk=s.pk)
+            subscription.subscribed = True
+
+            with self.assertNumQueries(1):
+                subscription.save()
+
+            self.assertTrue(subscription.subscribe_date)
+
+            subscription.refresh_from_db(fields=['subscribed'])
+            subscription.unsubscribed = True
+            subscription.save()
+
+            self.assertFalse(subscription.subscribed)
+            self.assertTrue(subscription.unsubscribe_date)
+
 
 class AllEmailsTestsMixin:
     """ Mixin for testing properties of sent e-mails for all message types. """
@@ -21,6 +21,16 @@ class SettingsTestCase(TestCase):
             ImproperlyConfigured, lambda: newsletter_settings.RICHTEXT_WIDGET
         )
 
+    @override_settings(NEWSLETTER_SUPPRESSION_LIST='banana.nowaythisexists')
+    def test_suppression_list_nonexistent(self):
+        """
+        Setting nonexistant suppression list yields ImproperlyConfigured.
+        """
+
+        self.assertRaises(
+            ImproperlyConfigured, lambda: newsletter_settings.SUPPRESSION_LIST
+        )
+
     @unittest.skipUnless(
         # Only run tests when TinyMCE is available
         'tinymce' in settings.INSTALLED_APPS,
@@ -102,6 +112,16 @@ class SettingsTestCase(TestCase):
         """
         self.assertFalse(newsletter_settings.CONFIRM_EMAIL_UPDATE)
 
+    @override_settings(NEWSLETTER_BATCH_SIZE=0)
+    def test_batch_size_zero(self):
+        """
+        Test whether a batch size of zero falls back to the default.
+        """
+        self.assertEqual(
+            newsletter_settings.BATCH_SIZE,
+            newsletter_settings.DEFAULT_BATCH_SIZE
+        )
+
     @override_settings(NEWSLETTER_THUMBNAIL='sorl-thumbnail')
     def test_thumbnail_sorl_thumbnail(self):
         """